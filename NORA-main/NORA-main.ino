@@ -44,6 +44,11 @@ float drop_distance_cm;
 
 tmElements_t next_sample_time, sample_interval, soak_time, dry_time;
 
+// Tide-aware sample schedule pushed by the topside computer, overrides sample_interval until used up
+uint32_t sample_schedule[MAX_SCHEDULE_ENTRIES];
+volatile uint8_t schedule_len = 0;
+volatile uint8_t schedule_idx = 0;
+
 uint8_t last_setting_page = 2; // amount of settings pages
 uint8_t settings_page = 1; // current settings page
 
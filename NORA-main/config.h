@@ -18,6 +18,8 @@
 #define COMMS_REPORT_SAMPLE_WATER_NOT_DETECTED_ERR  "EW"  // Report sample water not detected error
 #define COMMS_REPORT_ESTOP_PRESSED                  "EE"  // Report that the e-stop has been pressed
 
+#define MAX_SCHEDULE_ENTRIES 24 // Max sample times the topside computer can push at once (Q8), must match SCHEDULE_MAX_ENTRIES in the Python script
+
 /************************* Default Timings *************************/
 #define DEFAULT_SAMPLE_INTERVAL_HOUR 8
 #define DEFAULT_SAMPLE_INTERVAL_MIN  0
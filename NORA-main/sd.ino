@@ -137,7 +137,7 @@ float getDropDistance(){
     while (start_time + TOPSIDE_COMP_COMMS_TIMEOUT_MS > curr_time)
     {
         String data = checkForSerial();
-        if (data != "") {
+        if (data != "" && data[0] == 'W') { // Only accept the water level reply, not terminal queries
             drop_distance_cm = data.substring(1).toFloat();  // Convert to float
             Serial.println(drop_distance_cm);
             // return drop_distance_cm;
@@ -102,6 +102,7 @@ void onLowTrigger() {
  * @param delay_time next sample time
  */
 void updateAlarm(tmElements_t delay_time) {
+  schedule_len = 0; // Manually set sample time overrides the topside schedule
 
   breakTime(makeTime(next_sample_time), next_sample_time);
 
@@ -124,6 +125,7 @@ void updateAlarm(tmElements_t delay_time) {
  * 
  */
 void updateAlarm() {
+  schedule_len = 0; // Manually set interval overrides the topside schedule
   next_sample_time.Year = rtc.getYear() + sample_interval.Year;
   next_sample_time.Month = rtc.getMonth() + sample_interval.Month;
   next_sample_time.Day = rtc.getDay() + sample_interval.Day;
@@ -147,22 +149,85 @@ void updateAlarm() {
 void alarmTriggered() {
   // This will be called when the alarm is triggered
   // You can handle additional tasks here if needed
-  next_sample_time.Year = rtc.getYear() + sample_interval.Year;
-  next_sample_time.Month = rtc.getMonth() + sample_interval.Month;
-  next_sample_time.Day = rtc.getDay() + sample_interval.Day;
-  next_sample_time.Hour = rtc.getHours() + sample_interval.Hour;
-  next_sample_time.Minute = rtc.getMinutes() + sample_interval.Minute;
-  
-  breakTime(makeTime(next_sample_time), next_sample_time);
+  if (!armScheduleAlarm()) { // Fall back to the sample interval once the topside schedule is used up
+    next_sample_time.Year = rtc.getYear() + sample_interval.Year;
+    next_sample_time.Month = rtc.getMonth() + sample_interval.Month;
+    next_sample_time.Day = rtc.getDay() + sample_interval.Day;
+    next_sample_time.Hour = rtc.getHours() + sample_interval.Hour;
+    next_sample_time.Minute = rtc.getMinutes() + sample_interval.Minute;
+    
+    breakTime(makeTime(next_sample_time), next_sample_time);
 
-  rtc.setAlarmTime(next_sample_time.Hour, next_sample_time.Minute, 0); // Set alarm for the specified time
-  rtc.setAlarmDate(next_sample_time.Day, next_sample_time.Month, next_sample_time.Year);
+    rtc.setAlarmTime(next_sample_time.Hour, next_sample_time.Minute, 0); // Set alarm for the specified time
+    rtc.setAlarmDate(next_sample_time.Day, next_sample_time.Month, next_sample_time.Year);
+  }
 
   if (state == STANDBY && is_interval_sampling) {
     state = RELEASE;
   }
 }
 
+/**
+ * @brief sets the RTC alarm to the next future entry of the topside sample schedule
+ * 
+ * @return true if an entry was armed, false if the schedule is empty or used up
+ */
+bool armScheduleAlarm() {
+  uint32_t now = rtc.getEpoch();
+
+  while (schedule_idx < schedule_len && sample_schedule[schedule_idx] <= now) {
+    schedule_idx++;
+  }
+
+  if (schedule_idx >= schedule_len) {
+    schedule_len = 0;
+    schedule_idx = 0;
+    return false;
+  }
+
+  breakTime(sample_schedule[schedule_idx], next_sample_time);
+  next_sample_time.Year = tmYearToY2k(next_sample_time.Year); // Match the RTC's 2 digit years
+
+  rtc.setAlarmEpoch(sample_schedule[schedule_idx]);
+  return true;
+}
+
+/**
+ * @brief replaces the sample schedule with the one sent by the topside computer
+ * 
+ * @param entries comma separated list of epoch times, in increasing order
+ * @return number of future entries armed, 0 if none were usable
+ */
+uint8_t loadSampleSchedule(String entries) {
+  uint8_t count = 0;
+  int start = 0;
+
+  while (start < entries.length() && count < MAX_SCHEDULE_ENTRIES) {
+    int comma = entries.indexOf(',', start);
+    if (comma == -1) {
+      comma = entries.length();
+    }
+
+    uint32_t epoch = entries.substring(start, comma).toInt();
+    if (epoch > 0) {
+      sample_schedule[count++] = epoch;
+    }
+    start = comma + 1;
+  }
+
+  schedule_idx = 0;
+  schedule_len = count;
+
+  if (!armScheduleAlarm()) {
+    updateAlarm(); // Nothing usable, go back to interval sampling
+    return 0;
+  }
+
+  rtc.enableAlarm(rtc.MATCH_YYMMDDHHMMSS);
+  rtc.attachInterrupt(alarmTriggered);
+  return schedule_len - schedule_idx;
+}
+
 /* Key Press Functions *********************************************************/
 
 /**
@@ -798,6 +863,33 @@ void sendToPython(String string_to_send) {
             replyString += String(temp, 2);  // 2 decimal places
           }
 
+          else if (data[1] == '6') { // Clock sync probe, reply with current RTC time
+            replyString += "0E";
+            replyString += String(rtc.getEpoch());
+          }
+
+          else if (data[1] == '7') { // Clock correction, Q7<epoch>
+            uint32_t epoch = data.substring(2).toInt();
+            if (epoch > 0) {
+              rtc.setEpoch(epoch);
+              replyString += "0";
+            }
+            else {
+              replyString += "1";
+            }
+          }
+
+          else if (data[1] == '8') { // Sample schedule, Q8<epoch>,<epoch>,...
+            uint8_t armed = loadSampleSchedule(data.substring(2));
+            if (armed > 0) {
+              replyString += "0";
+              replyString += String(armed);
+            }
+            else {
+              replyString += "1";
+            }
+          }
+
           else {
             replyString += "1";
           }
@@ -915,7 +1007,7 @@ void setAlarmFault(AlarmFault fault_type) {
       String received = Serial.readStringUntil('\n'); // Read until newline
       received.trim(); // Remove whitespace or trailing chars
       
-      if (received.length() > 0) {
+      if (received.length() > 0 && isDigit(received[0])) { // Ignore anything that is not an epoch (e.g. stray Q probes)
         uint32_t epoch = received.toInt(); // Convert to uint32_t
         return epoch;
       }
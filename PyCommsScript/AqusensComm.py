@@ -1,21 +1,20 @@
 import threading
 import queue
 import serial
-import serial.tools.list_ports
 import glob
 import time
 import os
 from datetime import datetime
 import csv
+import json
 import signal
 import sys
-import requests
 import platform
-import calendar
-import pytz
 import re
-from terminalThread import *
-import email_errs
+import io_worker
+import clock_sync
+import sample_scheduler
+import archive
 
 BAUD_RATE = 115200
 AQUSENS_DIR = "C:/Aqusens/Aqusens_Latest_CPE/"
@@ -23,6 +22,7 @@ READ_FILE = "response_file.txt"
 WRITE_FILE = "command_file.txt"
 TEMP_CSV = "SampleTemps.csv"
 DIRECTORY_PATH = "D:/Data/Raw"
+ARCHIVE_PATH = "D:/Data/Archive"
 NOAA_TIDE_LEVEL_QUERY_URL = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter?date=latest&station=9412110&product=water_level&datum=MLLW&time_zone=lst&units=metric&format=json"
 
 TIDE_LEVEL_QUERY_TYPE   = "T"
@@ -39,6 +39,15 @@ AQUSENS_NACK_RECEIVED                      = "EA"
 AQUSENS_ACK_TIMEOUT                        = "EF"
 
 AQUSENS_ACK_TIMEOUT_SEC                    = 10
+PLC_REPLY_TIMEOUT_SEC                      = 2
+
+SERIAL_SETTLE_SEC           = 0.05  # Settle delay after opening the port, was a fixed 2 s sleep
+SERIAL_SETTLE_POLL_SEC      = 0.01
+RECONNECT_BACKOFF_START_SEC = 0.05
+RECONNECT_BACKOFF_MAX_SEC   = 1
+
+STATE_FILE                  = "comms_state.json"  # Restored after the supervisor restarts this script
+HEARTBEAT_INTERVAL_SEC      = 1
 
 CLI_DEBUG_MODE = False
 
@@ -103,19 +112,13 @@ class TerminalInterface:
         self.output_queue.put(message)
 
 def handleTerminalInput(ser, terminalCommand):
-    global isSampling, hours, minutes
+    global isSampling, hours, minutes, schedule_predictions
 
     match terminalCommand[0]:
         case "status":
-            safe_serial_write(ser, "Q0\n")
-            time.sleep(0.05)
-            replyString = safe_serial_readline(ser)
-            #print("got", replyString)
-            match = re.match(r"([01])H(\d+)M(\d+)", replyString)
-            if match:
-                isSampling = match.group(1) == '1'
-                hours = int(match.group(2))
-                minutes = int(match.group(3))
+            status = querySamplingStatus(ser)
+            if status:
+                isSampling, hours, minutes = status
 
                 status_string = "enabled" if isSampling else "disabled"
                 hour_str = " hour" if hours == 1 else " hours"
@@ -142,6 +145,7 @@ def handleTerminalInput(ser, terminalCommand):
                 if (reply is not None and len(reply) > 0):
                     if (reply[0] == 'S'):
                         print("Success!")
+                        sample_schedule.pushed = False # NORA drops the tide-aware schedule when the interval changes
                         if(reply[1] == '0'):
                             print("WARNING: NORA is not currently interval sampling!\n")
                     elif (reply[0] == '1'):
@@ -213,6 +217,26 @@ def handleTerminalInput(ser, terminalCommand):
             else:
                 print(f"ERR: Recv unknown reply -> {reply}")
             
+        case "schedule":
+            if len(terminalCommand) == 2 and terminalCommand[1] == "push":
+                print("Planning tide-aware sample schedule...")
+                fetched = net_worker.fetch_json(sample_scheduler.predictions_url())
+                if pushSampleSchedule(ser, fetched) is None:
+                    print("NORA is busy, the schedule will be pushed as soon as it is idle")
+                    schedule_predictions = fetched
+                saveState()
+            elif len(terminalCommand) != 1:
+                print("ERR: Invalid schedule usage!\n"
+                      "  Usage: schedule [push]\n")
+                return
+            print(sample_schedule.describe() + "\n")
+
+        case "clock":
+            print("Measuring NORA clock...")
+            rtc_sync.sync(ser)
+            saveState()
+            print(rtc_sync.report() + "\n")
+
         case "help":
             print("Known commands:\n"
                 "  status                              — View the current status of NORA\n" #Q0, recv 1HxxMxx for sampling, or 0HxxMxx for not sampling
@@ -221,6 +245,8 @@ def handleTerminalInput(ser, terminalCommand):
                 "  stop-sampling                       — Disable interval sampling\n" #Q3
                 "  run-sample                          — Start a sample manually\n" #Q4
                 "  read-temps                          — Returns the temperatures of all system RTDs\n" #Q5, recv 0R1XX.XXR2xx.xxR3xx.xx
+                "  schedule [push]                     — View the tide-aware sample schedule, or replan and push it now\n" #Q8<epoch>,<epoch>,...
+                "  clock                               — Sync NORA's clock and report its offset and drift\n" #Q6, recv 0E<epoch>, Q7<epoch> to set
                 "  help                                — See this lovely help message again")
         case _:
             print(
@@ -228,10 +254,101 @@ def handleTerminalInput(ser, terminalCommand):
                   "Type \"help\" to view all commands\n"
             )
 
+def readPlcReply(ser, is_reply, timeout=PLC_REPLY_TIMEOUT_SEC):
+    """
+    Reads the reply to a query just sent. Anything NORA sent on its own in the
+    meantime (T, S, ...) is kept in unhandled_plc_lines for the main loop.
+
+    Returns:
+        The reply, or None if it did not arrive within timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not ser.in_waiting:
+            time.sleep(0.001)
+            continue
+        line = safe_serial_readline(ser)
+        if is_reply(line):
+            return line
+        if line:
+            unhandled_plc_lines.append(line)
+    return None
+
+def querySamplingStatus(ser):
+    """Returns (isSampling, hours, minutes) as reported by NORA, or None on a bad reply."""
+    safe_serial_write(ser, "Q0\n")
+    replyString = readPlcReply(ser, lambda line: re.fullmatch(r"[01]H\d+M\d+", line) is not None)
+    #print("got", replyString)
+    if replyString is None:
+        return None
+    match = re.match(r"([01])H(\d+)M(\d+)", replyString)
+    return match.group(1) == '1', int(match.group(2)), int(match.group(3))
+
+def requestTidePredictions():
+    """Starts fetching tide predictions on the network worker, the main loop pushes the schedule once they arrive."""
+    global schedule_job
+    sample_schedule.next_plan = time.monotonic() + sample_scheduler.SCHEDULE_REPLAN_INTERVAL_SEC
+    schedule_job = net_worker.submit(io_worker.FETCH_JSON_JOB, sample_scheduler.predictions_url(), wait=True)
+    if schedule_job is None:
+        print("ERR: Could not request tide predictions, schedule not pushed")
+
+def pushSampleSchedule(ser, fetched):
+    """
+    Plans sample windows around low water from fetched tide predictions and
+    sends the whole schedule to NORA in one message.
+
+    Returns:
+        True if NORA took the schedule, False if it failed, or None if NORA was
+        busy talking to us and the push should be retried.
+    """
+    sample_schedule.next_plan = time.monotonic() + sample_scheduler.SCHEDULE_REPLAN_INTERVAL_SEC
+
+    ok, data = fetched
+    if not ok:
+        print(f"ERR: Could not fetch tide predictions ({data}), schedule not pushed")
+        return False
+    try:
+        times, levels = sample_scheduler.parse_predictions(data)
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"ERR: Bad tide predictions ({e}), schedule not pushed")
+        return False
+
+    status = querySamplingStatus(ser)
+    if unhandled_plc_lines:
+        return None
+    if status is None:
+        print("ERR: Could not read sampling interval from NORA, schedule not pushed")
+        return False
+    _, hours, minutes = status
+    interval_sec = (hours * 60 + minutes) * 60
+    if interval_sec == 0:
+        print("ERR: NORA sampling interval is zero, schedule not pushed")
+        return False
+
+    if not sample_schedule.plan(times, levels, interval_sec):
+        print("WARNING: No sample window has enough water, schedule not pushed")
+        return False
+
+    if ser.in_waiting:
+        return None # NORA is talking, its message would be read as the ack
+    safe_serial_write(ser, sample_schedule.push_command())
+    reply = readPlcReply(ser, lambda line: re.fullmatch(r"0\d+|1", line) is not None)
+    if reply and reply[0] == '0':
+        sample_schedule.pushed = True
+        print(f"Pushed {reply[1:]} sample windows to NORA ({sample_schedule.skipped} skipped for low water, "
+              f"{sample_schedule.crowded} dropped for spacing)")
+        return True
+
+    print(f"ERR: Recv err ack for schedule -> {reply}")
+    return False
+
 def detect_serial_port():
     if CLI_DEBUG_MODE:
         return None
 
+    if os.getenv("NORA_SERIAL_PORT"):
+        return os.getenv("NORA_SERIAL_PORT")
+
     system = platform.system()
     if system == "Windows":
         return "COM3"
@@ -275,24 +392,26 @@ def reportErr(err_type, last_aqusens_command=None):
         email_body = "UNKNOWN ERR"
         email_subject = "UNKNOWN ERR"
 
-    email_errs.send_email(email_subject, email_body)
+    net_worker.send_email(email_subject, email_body)
 
-def get_pacific_unix_epoch():
-    utc_now = datetime.now(pytz.UTC)
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    pacific_now = utc_now.astimezone(pacific_tz)
-    offset_seconds = pacific_now.utcoffset().total_seconds()
-    utc_timestamp = int(time.time())
-    adjusted_timestamp = utc_timestamp + int(offset_seconds)
-    return adjusted_timestamp
+net_worker = io_worker.NetworkWorker()
+last_heartbeat = 0
+active_session = None
+rtc_sync = clock_sync.ClockSync()
+sample_schedule = sample_scheduler.SampleSchedule()
+schedule_job = None          # Network worker job fetching tide predictions
+schedule_predictions = None  # Fetched predictions waiting for NORA to be idle
+unhandled_plc_lines = []     # PLC messages read while waiting on a query reply
+archiver = archive.SessionArchiver(DIRECTORY_PATH, ARCHIVE_PATH)
 
 def sigint_handler(signum, frame):
     if ser and ser.is_open:
         ser.close()
         print("Serial connection closed.")
-    sys.exit(0)
-
-signal.signal(signal.SIGINT, sigint_handler)
+    net_worker.stop()
+    archiver.stop()
+    sys.stdout.flush()
+    os._exit(0) # sys.exit() can abort at shutdown while the terminal thread holds stdin, which the supervisor would take as a crash
 
 def setup():
     if CLI_DEBUG_MODE:
@@ -302,13 +421,82 @@ def setup():
     port = detect_serial_port()
     try:
         ser = serial.Serial(port, 115200, timeout=10)
-        time.sleep(2)
+        settle_serial_port(ser)
         print(f"Connected to {port}")
         return ser
     except serial.SerialException as e:
         print(f"Serial error: {e}")
         return None
 
+def settle_serial_port(ser):
+    """
+    Short settle delay after opening the port, cut short once NORA has sent
+    something. This is not a handshake: NORA is not queried, since at boot it
+    is blocked waiting on its time request and would not answer.
+    """
+    deadline = time.monotonic() + SERIAL_SETTLE_SEC
+    try:
+        while time.monotonic() < deadline and not ser.in_waiting:
+            time.sleep(SERIAL_SETTLE_POLL_SEC)
+    except (OSError, serial.SerialException):
+        pass # The first read or write reports it and triggers a reconnect
+
+def heartbeat():
+    """Tells the supervisor (if there is one) that this process is still alive."""
+    global last_heartbeat
+    path = os.getenv("NORA_HEARTBEAT_FILE")
+    if not path or time.monotonic() - last_heartbeat < HEARTBEAT_INTERVAL_SEC:
+        return
+    last_heartbeat = time.monotonic()
+    try:
+        with open(path, "a"):
+            pass
+        os.utime(path)
+    except OSError:
+        pass
+
+def saveState():
+    state = {
+        "active_session": active_session,
+        "clock": rtc_sync.snapshot(),
+        "schedule": sample_schedule.snapshot(),
+    }
+    try:
+        with open(STATE_FILE + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(STATE_FILE + ".tmp", STATE_FILE)
+    except OSError as e:
+        print(f"[ERROR] Failed to save comms state: {e}")
+
+def restoreState():
+    """
+    Reloads clock sync and schedule state saved by a previous run.
+
+    Returns:
+        The sample session that was in progress when the previous run died, or None.
+    """
+    try:
+        with open(STATE_FILE, "r") as f:
+            state = json.load(f)
+        rtc_sync.restore(state["clock"])
+        sample_schedule.restore(state["schedule"])
+        return state["active_session"]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[ERROR] Ignoring unreadable comms state: {e}")
+        return None
+
+def resumeInterruptedSession(ser, session):
+    """Closes out a sample the previous run died in the middle of so NORA can move on to flushing."""
+    print(f"WARNING: Comms restarted during sample {session}, stopping collection")
+    try:
+        write_command("StopSampleCollection()")
+        wait_for_file_response("0", "stopsamplecollection", 21)
+        safe_serial_write(ser, "D\n")
+    except Exception as e:
+        print(f"Error closing out interrupted sample: {e}")
+
 def safe_serial_write(ser, message):
     try:
         ser.write(message.encode())
@@ -319,10 +507,12 @@ def safe_serial_write(ser, message):
             ser.close()
         raise
 
-def safe_serial_readline(ser):
+def safe_serial_readline(ser, drop_stale_probes=True):
     
     try:
         x = ser.readline().decode().strip()
+        while drop_stale_probes and rtc_sync.discard_stale(x):
+            x = ser.readline().decode().strip()
         #print("RECEIVED: -> " + x)
         return x
     except serial.SerialException as e:
@@ -332,15 +522,7 @@ def safe_serial_readline(ser):
         raise
 
 def queryForWaterLevel():
-    try:
-        response = requests.get(NOAA_TIDE_LEVEL_QUERY_URL)
-        if response.status_code == 200:
-            data = response.json()
-            return data['data'][0]['v']
-        else:
-            return -1000
-    except requests.exceptions.RequestException:
-        return -1000
+    return net_worker.query_water_level(NOAA_TIDE_LEVEL_QUERY_URL)
 
 def wait_for_file_response(expected_prefix, expected_content, min_length):
     start_time = time.time()  # Record the start time
@@ -368,6 +550,7 @@ def wait_for_file_response(expected_prefix, expected_content, min_length):
                 flushAqusensFifos()
                 return False  # Timeout has occurred
 
+            heartbeat()
             time.sleep(0.1)
 
 def flushAqusensFifos():
@@ -383,6 +566,7 @@ def write_command(command):
         output.flush()
 
 def communicate(ser, sample_time_sec):
+    global active_session
     try:
         stopPump(ser, True)
 
@@ -390,6 +574,8 @@ def communicate(ser, sample_time_sec):
         curr_time = now.strftime("%y%m%d_%H%M%S")
         directory = os.path.join(DIRECTORY_PATH, curr_time)
         os.makedirs(directory, exist_ok=True)
+        active_session = directory
+        saveState()
 
         write_command(f"SaveToDirectory({directory})")
         wait_for_file_response("0", "savetodirectory", 16)
@@ -432,6 +618,7 @@ def communicate(ser, sample_time_sec):
                     temperatures.append(rec)
                 except ValueError:
                     print("ERR: TEMP CONV ERR ", temp_data)
+                heartbeat()
                 time.sleep(15)
 
 
@@ -451,6 +638,10 @@ def communicate(ser, sample_time_sec):
         if ser and ser.is_open:
             ser.close()
 
+    finally:
+        active_session = None
+        saveState()
+
 def controlPump(ser, command_name, expected_ack, internal_comm=False):
     try:
         write_command(command_name)
@@ -470,45 +661,90 @@ def startPump(ser, internal_comm=False):
 
 def sendEpochTime(ser):
     try:
-        epoch_time = get_pacific_unix_epoch()
-        print(f"Sending epoch time: {epoch_time}")
-        safe_serial_write(ser, str(epoch_time) + "\n")
+        epoch_time = rtc_sync.send_epoch(ser, aligned=False) # NORA is blocked waiting on this, answer now and sync precisely later
+        rtc_sync.mark_set(precise=False)
+        rtc_sync.resync_soon()
+        print(f"Sent epoch time: {epoch_time}")
         return epoch_time
     except Exception as e:
         print(f"Error sending epoch time: {e}")
         return None
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGINT, sigint_handler) # Not at import, spawned archive workers re-import this file
+    interrupted_session = restoreState()
     ser = setup()
     terminal = TerminalInterface()
     terminal.start()
     flushAqusensFifos()
 
+    reconnect_delay = RECONNECT_BACKOFF_START_SEC
     while ser is None:
-        time.sleep(1)
+        heartbeat() # Waiting on the port is not a hang, don't let the supervisor restart us for it
+        time.sleep(reconnect_delay)
+        reconnect_delay = min(reconnect_delay * 2, RECONNECT_BACKOFF_MAX_SEC)
         print("Unable to set up serial connection. Retrying...")
         ser = setup()
 
+    archiver.start()
+
+    if interrupted_session:
+        resumeInterruptedSession(ser, interrupted_session)
+        interrupted_session = None # Closed out, the archiver's idle rule takes it from here
+        saveState()
+
     print("[NORA TERMINAL] > ", end="", flush=True)
 
+    reconnect_delay = RECONNECT_BACKOFF_START_SEC
     while True:
+        heartbeat()
+
         if ser is None or not ser.is_open:
             print("Serial disconnected. Reconnecting...")
             ser = setup()
+            if ser is None:
+                time.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, RECONNECT_BACKOFF_MAX_SEC)
+            else:
+                reconnect_delay = RECONNECT_BACKOFF_START_SEC
             continue
 
+        net_worker.service()
+        archiver.service(busy=(active_session, interrupted_session))
+
         cmd = terminal.get_command()
         if cmd:
             handleTerminalInput(ser, cmd)
             print("[NORA TERMINAL] > ", end="", flush=True)
 
         try:
-            write_to = safe_serial_readline(ser) if ser.in_waiting else None
+            if rtc_sync.due() and not ser.in_waiting:
+                rtc_sync.sync(ser)
+                saveState()
+
+            if sample_schedule.due():
+                requestTidePredictions()
+            if schedule_job is not None:
+                fetched = net_worker.result(schedule_job)
+                if fetched is not None:
+                    schedule_job = None
+                    schedule_predictions = fetched
+            if schedule_predictions is not None and not (ser.in_waiting or rtc_sync.unhandled or unhandled_plc_lines):
+                if pushSampleSchedule(ser, schedule_predictions) is not None:
+                    schedule_predictions = None
+                    saveState()
+
+            if rtc_sync.unhandled:
+                write_to = rtc_sync.unhandled.pop(0)
+            elif unhandled_plc_lines:
+                write_to = unhandled_plc_lines.pop(0)
+            else:
+                write_to = safe_serial_readline(ser, drop_stale_probes=False) if ser.in_waiting else None
         except:
             ser = None
             continue
 
-        if not write_to:
+        if not write_to or rtc_sync.discard_stale(write_to):
             continue
 
         if write_to == TIDE_LEVEL_QUERY_TYPE:
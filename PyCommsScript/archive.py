@@ -0,0 +1,360 @@
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+
+import worker_process
+
+ARCHIVE_CHUNK_SIZE        = 64 * 1024
+ARCHIVE_COMPRESSION_LEVEL = 6
+ARCHIVE_WORKERS           = 2
+ARCHIVE_MIN_IDLE_SEC      = 15 * 60   # A session untouched this long is finished being written
+ARCHIVE_SCAN_INTERVAL_SEC = 10 * 60
+ARCHIVE_STARTUP_DELAY_SEC = 60        # Keep the first scan out of the way of startup
+
+CHUNK_DIR    = "chunks"
+MANIFEST_DIR = "sessions"
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _lower_priority():
+    """Pool initializer, keeps archiving from competing with the serial process."""
+    worker_process.worker_init()
+    if hasattr(os, "nice"):
+        os.nice(10)
+    elif sys.platform == "win32":
+        import ctypes
+        BELOW_NORMAL_PRIORITY_CLASS = 0x4000
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), BELOW_NORMAL_PRIORITY_CLASS)
+
+
+def _chunk_path(archive_path, digest):
+    return os.path.join(archive_path, CHUNK_DIR, digest[:2], digest)
+
+
+def _manifest_path(archive_path, session):
+    return os.path.join(archive_path, MANIFEST_DIR, session + ".json")
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _store_chunk(archive_path, data):
+    """
+    Stores one chunk under the SHA-256 of its contents.
+
+    Returns:
+        (digest, compressed bytes written, 0 if the chunk was already stored)
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(archive_path, digest)
+    if os.path.exists(path):
+        return digest, 0
+    compressed = zlib.compress(data, ARCHIVE_COMPRESSION_LEVEL)
+    _write_atomic(path, compressed)
+    return digest, len(compressed)
+
+
+def _load_chunk(archive_path, digest):
+    with open(_chunk_path(archive_path, digest), "rb") as f:
+        data = zlib.decompress(f.read())
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ArchiveError(f"chunk {digest} is corrupt")
+    return data
+
+
+def _session_files(session_dir):
+    for root, _, files in os.walk(session_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, session_dir).replace(os.sep, "/")
+
+
+def find_completed_sessions(data_path, min_idle_sec=ARCHIVE_MIN_IDLE_SEC, now=None, exclude=()):
+    """
+    Lists session directories nothing has written to for min_idle_sec, skipping
+    the ones in exclude (the sample in progress), so the one the Aqusens is
+    still filling is never picked up.
+    """
+    if now is None:
+        now = time.time()
+    if not os.path.isdir(data_path):
+        return []
+    exclude = {os.path.normcase(os.path.abspath(path)) for path in exclude if path}
+
+    sessions = []
+    for entry in sorted(os.scandir(data_path), key=lambda e: e.name):
+        if not entry.is_dir() or os.path.normcase(os.path.abspath(entry.path)) in exclude:
+            continue
+        latest = entry.stat().st_mtime
+        for path, _ in _session_files(entry.path):
+            latest = max(latest, os.stat(path).st_mtime)
+        if now - latest >= min_idle_sec:
+            sessions.append(entry.path)
+    return sessions
+
+
+def archive_session(session_dir, archive_path, remove_original=True):
+    """
+    Splits every file of a session into content-addressed chunks, verifies the
+    archived copy reads back identically and only then removes the original.
+
+    Returns:
+        dict of stats for the session (bytes in, compressed bytes written, chunk counts, seconds).
+    """
+    start = time.perf_counter()
+    session = os.path.basename(os.path.normpath(session_dir))
+    files = []
+    stats = {"session": session, "files": 0, "bytes": 0, "stored_bytes": 0, "chunks": 0, "new_chunks": 0}
+
+    read_stats = {}  # rel_path -> (size, mtime_ns) before reading, to catch late writes
+    for path, rel_path in _session_files(session_dir):
+        file_hash = hashlib.sha256()
+        chunks = []
+        size = 0
+        st = os.stat(path)
+        read_stats[rel_path] = (st.st_size, st.st_mtime_ns)
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(ARCHIVE_CHUNK_SIZE)
+                if not data:
+                    break
+                digest, written = _store_chunk(archive_path, data)
+                file_hash.update(data)
+                chunks.append(digest)
+                size += len(data)
+                stats["chunks"] += 1
+                if written:
+                    stats["new_chunks"] += 1
+                    stats["stored_bytes"] += written
+
+        files.append({"path": rel_path, "size": size, "mtime": st.st_mtime,
+                      "sha256": file_hash.hexdigest(), "chunks": chunks})
+        stats["files"] += 1
+        stats["bytes"] += size
+
+    manifest = {"session": session, "chunk_size": ARCHIVE_CHUNK_SIZE, "files": files}
+    verify_manifest(archive_path, manifest)
+    _merge_manifest(archive_path, manifest)
+    _write_atomic(_manifest_path(archive_path, session), json.dumps(manifest, indent=1).encode())
+
+    if remove_original:
+        _remove_original(session_dir, read_stats)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def _merge_manifest(archive_path, manifest):
+    """
+    Carries over files from an earlier manifest of the same session. If removing
+    the original was cut short, the next pass only sees the files left behind,
+    and the ones already deleted must stay readable.
+    """
+    try:
+        previous = load_manifest(archive_path, manifest["session"])
+    except FileNotFoundError:
+        return
+    paths = {entry["path"] for entry in manifest["files"]}
+    manifest["files"] = sorted(manifest["files"] + [entry for entry in previous["files"] if entry["path"] not in paths],
+                               key=lambda entry: entry["path"])
+
+
+def _remove_original(session_dir, read_stats):
+    """
+    Deletes the archived files of a session, re-checking each one right before
+    it goes. Anything written since it was read is left in place, and so is the
+    directory, for the next scan to pick up.
+    """
+    def unchanged(path, rel_path):
+        st = os.stat(path)
+        return read_stats.get(rel_path) == (st.st_size, st.st_mtime_ns)
+
+    session = os.path.basename(os.path.normpath(session_dir))
+    changed = [rel_path for path, rel_path in _session_files(session_dir) if not unchanged(path, rel_path)]
+    if changed:
+        raise ArchiveError(f"{session}/{changed[0]} changed while it was being archived, original kept")
+
+    for path, rel_path in list(_session_files(session_dir)):
+        if not unchanged(path, rel_path):
+            raise ArchiveError(f"{session}/{rel_path} changed while it was being archived, left in place")
+        os.remove(path)
+    for root, _, _ in os.walk(session_dir, topdown=False):
+        os.rmdir(root)
+
+
+def verify_manifest(archive_path, manifest):
+    """Rebuilds every file from the chunk store and checks it against its recorded hash."""
+    for entry in manifest["files"]:
+        file_hash = hashlib.sha256()
+        size = 0
+        for digest in entry["chunks"]:
+            data = _load_chunk(archive_path, digest)
+            file_hash.update(data)
+            size += len(data)
+        if size != entry["size"] or file_hash.hexdigest() != entry["sha256"]:
+            raise ArchiveError(f"{manifest['session']}/{entry['path']} does not match its archived copy")
+
+
+def load_manifest(archive_path, session):
+    with open(_manifest_path(archive_path, session), "r") as f:
+        return json.load(f)
+
+
+def read_file(archive_path, session, rel_path):
+    """Reads a single file out of an archived session, touching only its own chunks."""
+    for entry in load_manifest(archive_path, session)["files"]:
+        if entry["path"] == rel_path:
+            return b"".join(_load_chunk(archive_path, digest) for digest in entry["chunks"])
+    raise FileNotFoundError(f"{rel_path} is not in archived session {session}")
+
+
+def extract_file(archive_path, session, rel_path, dest):
+    data = read_file(archive_path, session, rel_path)
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    with open(dest, "wb") as f:
+        f.write(data)
+
+
+class SessionArchiver:
+    """
+    Archives finished sessions from the data directory in a low priority
+    process pool. Scanning for sessions runs in the pool too, so service() is
+    cheap and meant to be called from the serial loop.
+    """
+    def __init__(self, data_path, archive_path, workers=ARCHIVE_WORKERS):
+        self.data_path = data_path
+        self.archive_path = archive_path
+        self.workers = workers
+        self.pool = None
+        self.scan = None       # future of the running find_completed_sessions
+        self.in_progress = {}  # session dir -> future
+        self.next_scan = 0
+
+    def start(self):
+        import concurrent.futures
+
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_lower_priority,
+                                                           mp_context=worker_process.spawn_context())
+        self.next_scan = time.monotonic() + ARCHIVE_STARTUP_DELAY_SEC
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        self.scan = None
+        self.in_progress.clear()
+
+    def service(self, busy=()):
+        """busy: session directories that are still in use and must not be archived."""
+        if self.pool is None:
+            return
+        from concurrent.futures import BrokenExecutor
+
+        try:
+            self._collect()
+            if self.scan is None and time.monotonic() >= self.next_scan:
+                self.next_scan = time.monotonic() + ARCHIVE_SCAN_INTERVAL_SEC
+                self.scan = self.pool.submit(find_completed_sessions, self.data_path, exclude=busy)
+        except BrokenExecutor as e:
+            # A worker died (OOM, killed), the pool refuses new work until it is rebuilt
+            print(f"[ARCHIVE] ERR: Archive pool broke, restarting it: {e}")
+            self.stop()
+            self.start()
+
+    def _collect(self):
+        for session_dir, future in list(self.in_progress.items()):
+            if not future.done():
+                continue
+            del self.in_progress[session_dir]
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"[ARCHIVE] ERR: Failed to archive {session_dir}, retrying next scan: {e}")
+                continue
+            ratio = stats["bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else float("inf")
+            print(f"[ARCHIVE] {stats['session']}: {stats['files']} files, {stats['bytes']} bytes "
+                  f"stored as {stats['stored_bytes']} ({ratio:.1f}x)")
+
+        if self.scan is None or not self.scan.done():
+            return
+        scan, self.scan = self.scan, None
+        try:
+            sessions = scan.result()
+        except OSError as e:
+            print(f"[ARCHIVE] ERR: Could not scan {self.data_path}: {e}")
+            return
+        for session_dir in sessions:
+            if session_dir not in self.in_progress:
+                self.in_progress[session_dir] = self.pool.submit(archive_session, session_dir, self.archive_path)
+
+
+def _write_synthetic_session(session_dir, seed):
+    """Roughly mimics an Aqusens session: a fixed instrument config and noisy spectra CSVs."""
+    import random
+
+    rng = random.Random(seed)
+    os.makedirs(session_dir)
+    with open(os.path.join(session_dir, "InstrumentConfig.xml"), "w") as f:
+        f.write("<config>\n" + "".join(f"  <param id=\"{i}\">{i * 0.125:.3f}</param>\n" for i in range(2000)) + "</config>\n")
+    for n in range(4):
+        with open(os.path.join(session_dir, f"Spectrum_{n:03d}.csv"), "w") as f:
+            f.write("Wavelength(nm),Intensity,Reference\n")
+            for i in range(20000):
+                wavelength = 200 + i * 0.05
+                f.write(f"{wavelength:.2f},{1000 + rng.gauss(0, 15):.3f},{998.5 + rng.gauss(0, 2):.3f}\n")
+
+
+def benchmark(sessions=8):
+    """Archives synthetic sessions in a temp directory and reports ratio and throughput."""
+    import concurrent.futures
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "Raw")
+        archive_path = os.path.join(tmp, "Archive")
+        for i in range(sessions):
+            _write_synthetic_session(os.path.join(data_path, f"250501_{i:06d}"), i)
+
+        start = time.perf_counter()
+        total = {"bytes": 0, "stored_bytes": 0, "chunks": 0, "new_chunks": 0}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=ARCHIVE_WORKERS, initializer=_lower_priority) as pool:
+            sessions_found = find_completed_sessions(data_path, min_idle_sec=0)
+            for stats in pool.map(archive_session, sessions_found, [archive_path] * len(sessions_found)):
+                for key in total:
+                    total[key] += stats[key]
+        elapsed = time.perf_counter() - start
+
+        session = os.path.basename(sessions_found[0])
+        start = time.perf_counter()
+        read_file(archive_path, session, "Spectrum_002.csv")
+        read_ms = (time.perf_counter() - start) * 1000
+
+        mb = total["bytes"] / 1e6
+        print(f"Sessions:          {len(sessions_found)}")
+        print(f"Raw data:          {mb:.1f} MB")
+        print(f"Stored:            {total['stored_bytes'] / 1e6:.2f} MB ({total['bytes'] / total['stored_bytes']:.1f}x)")
+        print(f"Deduped chunks:    {total['chunks'] - total['new_chunks']} of {total['chunks']}")
+        print(f"Throughput:        {mb / elapsed:.1f} MB/s with {ARCHIVE_WORKERS} workers (incl. verify)")
+        print(f"Single file read:  {read_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "extract":
+        # python archive.py extract <archive path> <session> <file in session>
+        _, _, archive_path, session, rel_path = sys.argv
+        extract_file(archive_path, session, rel_path, os.path.basename(rel_path))
+        print(f"Extracted {rel_path} from {session}")
+    else:
+        benchmark()
@@ -0,0 +1,298 @@
+import bisect
+import math
+import re
+import time
+from datetime import datetime
+
+PACIFIC_TZ_NAME  = "America/Los_Angeles"
+DST_TABLE_YEARS  = 10                 # Years of DST transitions precomputed ahead of now
+DST_SCAN_STEP_SEC = 7 * 24 * 3600     # Transitions are months apart, weekly steps can't miss one
+
+CLOCK_PROBE_QUERY         = "Q6\n"    # PLC replies 0E<rtc epoch>
+CLOCK_SET_QUERY           = "Q7"      # Q7<epoch>, PLC replies 0 on success
+SYNC_PROBE_COUNT          = 8
+SYNC_PROBE_SPACING_SEC    = 0.135     # Not a divisor of 1 s, so probes sample different phases of the 1 s RTC tick
+SYNC_REPLY_TIMEOUT_SEC    = 1
+SYNC_CORRECTION_THRESHOLD_SEC = 1     # The RTC only has whole seconds, don't chase anything smaller
+CLOCK_RESYNC_INTERVAL_SEC = 6 * 3600
+CLOCK_BOOT_RESYNC_DELAY_SEC = 60      # Precise sync this long after answering a boot time request
+CLOCK_HISTORY_LEN         = 32
+DRIFT_MIN_BASELINE_SEC    = 3600      # 1 s RTC resolution makes shorter baselines meaningless
+DEFAULT_ONE_WAY_DELAY_SEC = 12 * 10 / 115200  # ~12 characters at 10 bits each, until a probe measures it
+
+
+class PacificClock:
+    """
+    Converts UTC to the Pacific "local epoch" that the PLC RTC keeps. DST
+    transitions are precomputed once into a table and the segment holding the
+    last answer is cached, so each lookup is O(1) with no timezone math.
+    """
+    def __init__(self, years=DST_TABLE_YEARS):
+        self.years = years
+        self.transitions = None   # Sorted UTC instants where the offset changes, plus an end sentinel
+        self.offsets = None       # offsets[i] applies from transitions[i] up to transitions[i + 1]
+        self.seg_start = 0
+        self.seg_end = 0
+        self.seg_offset = 0
+
+    def _build(self, utc):
+        import pytz
+
+        tz = pytz.timezone(PACIFIC_TZ_NAME)
+
+        def offset_at(t):
+            return int(datetime.fromtimestamp(t, tz).utcoffset().total_seconds())
+
+        start = utc - 366 * 24 * 3600
+        end = utc + int(self.years * 365.25 * 24 * 3600)
+        transitions = [start]
+        offsets = [offset_at(start)]
+
+        t = start
+        while t < end:
+            nxt = min(t + DST_SCAN_STEP_SEC, end)
+            if offset_at(nxt) != offsets[-1]:
+                lo, hi = t, nxt  # Bisect down to the exact second of the change
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if offset_at(mid) == offsets[-1]:
+                        lo = mid
+                    else:
+                        hi = mid
+                transitions.append(hi)
+                offsets.append(offset_at(hi))
+            t = nxt
+
+        transitions.append(end)
+        self.transitions = transitions
+        self.offsets = offsets
+
+    def utc_offset(self, utc):
+        """Returns the Pacific UTC offset in seconds at the given UTC timestamp."""
+        if not (self.seg_start <= utc < self.seg_end):
+            if self.transitions is None or not (self.transitions[0] <= utc < self.transitions[-1]):
+                self._build(int(utc))
+            i = bisect.bisect_right(self.transitions, utc) - 1
+            self.seg_start = self.transitions[i]
+            self.seg_end = self.transitions[i + 1]
+            self.seg_offset = self.offsets[i]
+        return self.seg_offset
+
+    def epoch(self, utc=None):
+        """Returns the Pacific local epoch (as a float) at the given UTC timestamp, default now."""
+        if utc is None:
+            utc = time.time()
+        return utc + self.utc_offset(utc)
+
+
+pacific_clock = PacificClock()
+
+
+def get_pacific_unix_epoch():
+    """
+    Get a Unix timestamp that, when directly interpreted by a device with no timezone awareness,
+    will display the current Pacific Time.
+
+    Returns:
+        int: Unix timestamp adjusted to show Pacific Time
+    """
+    utc = time.time()
+    return int(utc) + pacific_clock.utc_offset(utc)
+
+
+class ClockSync:
+    """
+    Keeps the PLC RTC on Pacific time. Offset and round-trip time are estimated
+    from several timestamped Q6 probes, the RTC is corrected with Q7 when it is
+    off by a second or more, and every measurement is kept for a drift report.
+    """
+    def __init__(self, clock=pacific_clock):
+        self.clock = clock
+        self.one_way_delay = DEFAULT_ONE_WAY_DELAY_SEC
+        self.last_sync = time.monotonic()   # Don't probe a PLC that may still be booting
+        self.drift_base = None              # (utc, offset) drift is measured from, reset on every correction
+        self.last_correction = None
+        self.history = []                   # (utc, offset, rtt) per measurement, newest last
+        self.unhandled = []                 # PLC messages read while waiting on a probe reply
+        self.stale_probes = 0               # Probes NORA has not answered yet, their 0E replies may still show up
+        self.stale_set_acks = 0             # Same for Q7 corrections and their 0/1 acks
+
+    def due(self):
+        return time.monotonic() - self.last_sync > CLOCK_RESYNC_INTERVAL_SEC
+
+    def _read_reply(self, ser):
+        deadline = time.monotonic() + SYNC_REPLY_TIMEOUT_SEC
+        while not ser.in_waiting:
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.001)
+        return ser.readline().decode().strip()
+
+    def discard_stale(self, line):
+        """
+        Returns True if line is a late answer to a probe or correction that was
+        not answered in time, which the caller should drop instead of treating
+        it as a reply to its own query.
+        """
+        if self.stale_probes and re.fullmatch(r"0E\d+", line):
+            self.stale_probes -= 1
+            return True
+        if self.stale_set_acks and line in ("0", "1"):
+            self.stale_set_acks -= 1
+            return True
+        return False
+
+    def _read_answer(self, ser):
+        """Reads the reply to the query just sent, skipping late answers to earlier ones."""
+        reply = self._read_reply(ser)
+        while reply is not None and self.discard_stale(reply):
+            reply = self._read_reply(ser)
+        return reply
+
+    def _probe(self, ser):
+        while (self.stale_probes or self.stale_set_acks) and ser.in_waiting:
+            line = ser.readline().decode().strip()
+            if not self.discard_stale(line):
+                if line:
+                    self.unhandled.append(line)
+                return None
+
+        sent = time.time()
+        ser.write(CLOCK_PROBE_QUERY.encode())
+        reply = self._read_answer(ser)
+        received = time.time()
+
+        match = re.fullmatch(r"0E(\d+)", reply) if reply is not None else None
+        if not match:
+            # Timed out, or NORA spoke first (S, T, ...). Either way the probe is still answered later
+            self.stale_probes = min(self.stale_probes + 1, SYNC_PROBE_COUNT)
+            if reply:
+                self.unhandled.append(reply)
+            return None
+
+        # The RTC truncates to whole seconds, +0.5 centres the estimate
+        rtc_epoch = int(match.group(1)) + 0.5
+        return rtc_epoch - self.clock.epoch((sent + received) / 2), received - sent
+
+    def measure(self, ser, probes=SYNC_PROBE_COUNT):
+        """
+        Probes the PLC RTC and estimates its offset from Pacific time.
+
+        Returns:
+            (offset_sec, rtt_sec) from the lowest-latency half of the probes, or None if none were answered.
+        """
+        samples = []
+        for _ in range(probes):
+            sample = self._probe(ser)
+            if sample is None:
+                break  # PLC is busy or talking to us, don't keep it waiting on more probes
+            samples.append(sample)
+            time.sleep(SYNC_PROBE_SPACING_SEC)
+
+        if not samples:
+            return None
+
+        samples.sort(key=lambda sample: sample[1])
+        best = samples[:max(1, len(samples) // 2)]
+        offset = sum(o for o, _ in best) / len(best)
+        rtt = best[0][1]
+        self.one_way_delay = rtt / 2
+
+        now = time.time()
+        self.history.append((now, offset, rtt))
+        del self.history[:-CLOCK_HISTORY_LEN]
+        if self.drift_base is None:
+            self.drift_base = (now, offset)
+        return offset, rtt
+
+    def send_epoch(self, ser, prefix="", aligned=True):
+        """
+        Sends prefix + the Pacific epoch, timed so it arrives at the PLC right on
+        the whole second it names, which is the best the RTC can represent.
+        With aligned=False it is sent right away, rounded to the nearest second.
+
+        Returns:
+            The epoch that was sent.
+        """
+        arrival = self.clock.epoch(time.time() + self.one_way_delay)
+        if aligned:
+            epoch = math.floor(arrival) + 1
+            time.sleep(epoch - arrival)
+        else:
+            epoch = round(arrival)
+        ser.write(f"{prefix}{epoch}\n".encode())
+        return epoch
+
+    def mark_set(self, precise=True):
+        """
+        Records that NORA accepted a new RTC time. Drift is only measured from a
+        precise set, after an imprecise one the next measurement becomes the base.
+        """
+        self.last_correction = time.time()
+        self.drift_base = (self.last_correction, 0.0) if precise else None
+
+    def sync(self, ser):
+        """Measures the RTC offset and corrects the RTC if it has drifted."""
+        self.last_sync = time.monotonic()
+        result = self.measure(ser)
+        if result is None:
+            print("[CLOCK] PLC did not answer clock probes, retrying next interval")
+            return None
+
+        offset, rtt = result
+        if abs(offset) >= SYNC_CORRECTION_THRESHOLD_SEC:
+            epoch = self.send_epoch(ser, CLOCK_SET_QUERY)
+            reply = self._read_answer(ser)
+            if reply == "0":
+                self.mark_set()
+                print(f"[CLOCK] PLC clock was off by {offset:+.2f} s, set to {epoch}")
+            elif reply == "1":
+                print(f"[CLOCK] ERR: PLC rejected clock correction to {epoch}")
+            else:
+                print("[CLOCK] ERR: PLC did not ack clock correction in time")
+                self.stale_set_acks += 1  # The ack may still show up
+                if reply:
+                    self.unhandled.append(reply)
+        return offset, rtt
+
+    def resync_soon(self):
+        """Makes the next background sync happen CLOCK_BOOT_RESYNC_DELAY_SEC from now."""
+        self.last_sync = time.monotonic() - CLOCK_RESYNC_INTERVAL_SEC + CLOCK_BOOT_RESYNC_DELAY_SEC
+
+    def snapshot(self):
+        """Wall clock state worth keeping across a comms restart."""
+        return {"drift_base": self.drift_base, "last_correction": self.last_correction,
+                "history": self.history, "one_way_delay": self.one_way_delay,
+                "last_sync_age": time.monotonic() - self.last_sync, "saved_at": time.time()}
+
+    def restore(self, state):
+        self.drift_base = tuple(state["drift_base"]) if state["drift_base"] else None
+        self.last_correction = state["last_correction"]
+        self.history = [tuple(entry) for entry in state["history"]]
+        self.one_way_delay = state["one_way_delay"]
+        age = state["last_sync_age"] + max(0, time.time() - state["saved_at"])
+        self.last_sync = time.monotonic() - age
+
+    def drift_ppm(self):
+        if self.drift_base is None or not self.history:
+            return None
+        base_time, base_offset = self.drift_base
+        now, offset, _ = self.history[-1]
+        if now - base_time < DRIFT_MIN_BASELINE_SEC:
+            return None
+        return (offset - base_offset) / (now - base_time) * 1e6
+
+    def report(self):
+        if not self.history:
+            return "PLC clock has not been measured yet."
+
+        measured, offset, rtt = self.history[-1]
+        lines = [f"PLC clock offset: {offset:+.2f} s (RTT {rtt * 1000:.1f} ms), "
+                 f"measured {int(time.time() - measured)} s ago"]
+
+        drift = self.drift_ppm()
+        if drift is not None:
+            lines.append(f"Estimated drift: {drift:+.1f} ppm ({drift * 86400 / 1e6:+.2f} s/day)")
+        if self.last_correction is not None:
+            lines.append(f"Last set: {int(time.time() - self.last_correction)} s ago")
+        return "\n".join(lines)
@@ -0,0 +1,157 @@
+"""
+Checks ClockSync against a fake PLC on a pseudo-terminal. The fake PLC keeps
+a whole-second RTC that starts off by a known amount and answers Q6/Q7 with an
+injected one-way delay, so the estimated offset, the RTT and the Q7 correction
+can be compared against the truth. Also checks that a PLC that stops reading
+serial costs a single probe timeout and that late answers are dropped, also
+when NORA sends a message of its own before answering.
+POSIX only, since it needs a pty.
+
+    python clock_sync_check.py [one way delay ms] [initial RTC offset s]
+"""
+import os
+import sys
+import threading
+import time
+
+import clock_sync
+
+OFFSET_TOLERANCE_SEC    = 0.6    # Probes are centred on the 1 s RTC tick, allow just over half of it
+RTT_TOLERANCE_SEC       = 0.02
+SET_TOLERANCE_SEC       = 0.1
+SILENT_MEASURE_MAX_SEC  = clock_sync.SYNC_REPLY_TIMEOUT_SEC + 0.5
+
+
+class FakePLC:
+    """Answers Q6 with its RTC and sets it on Q7, each message delayed by delay_sec in both directions."""
+    def __init__(self, fd, delay_sec, offset_sec, clock=clock_sync.pacific_clock):
+        self.fd = fd
+        self.delay_sec = delay_sec
+        self.clock = clock
+        self.rtc_base = clock.epoch() + offset_sec  # RTC reading at rtc_set_at
+        self.rtc_set_at = time.time()
+        self.silent = False
+        self.speak_first = None     # (query prefix, line): send line just before answering that query
+        self.received = []
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def rtc(self):
+        return self.rtc_base + time.time() - self.rtc_set_at
+
+    def true_offset(self):
+        return self.rtc() - self.clock.epoch()
+
+    def _reply(self, line):
+        time.sleep(self.delay_sec)
+        os.write(self.fd, f"{line}\r\n".encode())
+
+    def _run(self):
+        buf = b""
+        while self.running:
+            try:
+                buf += os.read(self.fd, 100)
+            except OSError:
+                return
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                line = line.decode().strip()
+                time.sleep(self.delay_sec)
+                self.received.append(line)
+                if self.silent:
+                    continue
+                if self.speak_first and line.startswith(self.speak_first[0]):
+                    os.write(self.fd, f"{self.speak_first[1]}\r\n".encode())
+                    self.speak_first = None
+                if line == clock_sync.CLOCK_PROBE_QUERY.strip():
+                    self._reply(f"0E{int(self.rtc())}")
+                elif line.startswith(clock_sync.CLOCK_SET_QUERY):
+                    self.rtc_base = int(line[len(clock_sync.CLOCK_SET_QUERY):])
+                    self.rtc_set_at = time.time()
+                    self._reply("0")
+
+
+def check(name, ok, detail):
+    print(f"[{'PASS' if ok else 'FAIL'}] {name}: {detail}")
+    return ok
+
+
+def main(delay_ms=40, offset_sec=-3.3):
+    if os.name != "posix":
+        print("clock_sync_check needs a pty and only runs on Linux/macOS")
+        return 1
+
+    import pty
+    import tty
+    import serial
+
+    plc_fd, port_fd = pty.openpty()
+    tty.setraw(port_fd)
+    ser = serial.Serial(os.ttyname(port_fd), 115200, timeout=2)
+    plc = FakePLC(plc_fd, delay_ms / 1000, offset_sec)
+    plc.thread.start()
+    sync = clock_sync.ClockSync()
+    results = []
+
+    truth = plc.true_offset()
+    offset, rtt = sync.measure(ser)
+    results.append(check("offset estimate", abs(offset - truth) < OFFSET_TOLERANCE_SEC,
+                         f"estimated {offset:+.2f} s, actual {truth:+.2f} s"))
+    results.append(check("RTT estimate", abs(rtt - 2 * plc.delay_sec) < RTT_TOLERANCE_SEC,
+                         f"estimated {rtt * 1000:.1f} ms, injected {2 * delay_ms} ms"))
+
+    sync.sync(ser)
+    error = plc.true_offset()
+    results.append(check("Q7 correction", abs(error) < SET_TOLERANCE_SEC,
+                         f"RTC off by {error * 1000:+.0f} ms after sync"))
+
+    plc.silent = True
+    sent_before = len(plc.received)
+    start = time.monotonic()
+    result = sync.measure(ser)
+    elapsed = time.monotonic() - start
+    time.sleep(2 * plc.delay_sec + 0.05)
+    probes = len(plc.received) - sent_before
+    results.append(check("silent PLC", result is None and probes == 1 and elapsed < SILENT_MEASURE_MAX_SEC,
+                         f"gave up after {elapsed:.2f} s and {probes} probe(s)"))
+
+    plc.silent = False
+    os.write(plc_fd, f"0E{int(plc.rtc())}\r\nT\r\n".encode())  # Late answer to the timed out probe, then a real message
+    time.sleep(0.05)
+    lines = [ser.readline().decode().strip() for _ in range(2)]
+    kept = [line for line in lines if not sync.discard_stale(line)]
+    results.append(check("late probe reply", kept == ["T"], f"read {lines}, kept {kept}"))
+
+    # NORA starts a sample just as a probe goes out, its S crosses the Q6 on the wire
+    plc.speak_first = (clock_sync.CLOCK_PROBE_QUERY.strip(), "S")
+    result = sync.measure(ser)
+    time.sleep(2 * plc.delay_sec + 0.05)
+    os.write(plc_fd, b"0T18.25\r\n")  # Answer to the first T of the sample, behind the late 0E
+    lines = [ser.readline().decode().strip() for _ in range(2)]
+    kept = [line for line in lines if not sync.discard_stale(line)]
+    results.append(check("PLC speaks first on Q6", result is None and sync.unhandled == ["S"] and kept == ["0T18.25"],
+                         f"unhandled {sync.unhandled}, read {lines}, kept {kept}"))
+    sync.unhandled.clear()
+
+    plc.rtc_base += 5
+    drift_base = sync.drift_base
+    plc.speak_first = (clock_sync.CLOCK_SET_QUERY, "T")
+    sync.sync(ser)
+    time.sleep(2 * plc.delay_sec + 0.05)
+    os.write(plc_fd, b"0T18.25\r\n")
+    lines = [ser.readline().decode().strip() for _ in range(2)]
+    kept = [line for line in lines if not sync.discard_stale(line)]
+    results.append(check("PLC speaks first on Q7", sync.unhandled == ["T"] and kept == ["0T18.25"]
+                         and sync.drift_base == drift_base,
+                         f"unhandled {sync.unhandled}, read {lines}, kept {kept}, drift base kept {sync.drift_base == drift_base}"))
+
+    plc.running = False
+    ser.close()
+    os.close(plc_fd)
+    os.close(port_fd)
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    args = [float(arg) for arg in sys.argv[1:3]]
+    sys.exit(main(*args))
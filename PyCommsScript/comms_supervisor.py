@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import time
+
+COMMS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AqusensComm.py")
+HEARTBEAT_FILE = "comms_heartbeat"
+
+WATCHDOG_TIMEOUT_SEC    = 90   # Longer than any single blocking step in AqusensComm (15 s sample sleeps, 10 s serial reads)
+WATCHDOG_POLL_SEC       = 0.5
+RESTART_BACKOFF_SEC     = [0, 1, 5, 30]  # Back off if the script keeps crashing right away
+HEALTHY_RUN_SEC         = 60   # A run this long resets the backoff
+
+
+def heartbeat_age(path):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def run_once(env):
+    """
+    Runs AqusensComm until it exits or stops touching its heartbeat file.
+
+    Returns:
+        The exit code, or None if the watchdog had to kill it.
+    """
+    started = time.time()
+    comms = subprocess.Popen([sys.executable, COMMS_SCRIPT], env=env)
+
+    while True:
+        try:
+            return comms.wait(WATCHDOG_POLL_SEC)
+        except subprocess.TimeoutExpired:
+            pass
+
+        age = heartbeat_age(env["NORA_HEARTBEAT_FILE"])
+        if age is None:
+            age = time.time() - started  # Hasn't written its first heartbeat yet
+        if age > WATCHDOG_TIMEOUT_SEC:
+            print(f"[SUPERVISOR] No heartbeat from AqusensComm in {int(age)} s, killing it")
+            comms.kill()
+            comms.wait()
+            return None
+
+
+def supervise():
+    env = dict(os.environ, NORA_HEARTBEAT_FILE=os.path.abspath(HEARTBEAT_FILE))
+    failures = 0
+
+    while True:
+        if os.path.exists(HEARTBEAT_FILE):
+            os.remove(HEARTBEAT_FILE)
+
+        started = time.time()
+        code = run_once(env)
+
+        if code == 0:
+            print("[SUPERVISOR] AqusensComm exited cleanly")
+            return
+
+        if time.time() - started > HEALTHY_RUN_SEC:
+            failures = 0
+        delay = RESTART_BACKOFF_SEC[min(failures, len(RESTART_BACKOFF_SEC) - 1)]
+        failures += 1
+
+        reason = "hung" if code is None else f"crashed with exit code {code}"
+        print(f"[SUPERVISOR] AqusensComm {reason}, restarting in {delay} s")
+        time.sleep(delay)
+
+
+if __name__ == "__main__":
+    try:
+        supervise()
+    except KeyboardInterrupt:
+        pass  # Ctrl+C reaches AqusensComm too, which closes the serial port itself
@@ -0,0 +1,248 @@
+import threading
+import itertools
+import time
+
+import worker_process
+
+WATER_LEVEL_JOB = "W"
+FETCH_JSON_JOB  = "J"
+EMAIL_JOB       = "E"
+
+WATER_LEVEL_ERR_VALUE = -1000
+
+NOAA_QUERY_TIMEOUT_SEC  = 5   # requests.get timeout inside the worker
+WORKER_HANG_TIMEOUT_SEC = 60  # a job outstanding this long means the worker is wedged
+WORKER_STOP_TIMEOUT_SEC = 1
+
+
+def _query_water_level(url):
+    import requests
+
+    try:
+        response = requests.get(url, timeout=NOAA_QUERY_TIMEOUT_SEC)
+        if response.status_code == 200:
+            data = response.json()
+            return data['data'][0]['v']
+        else:
+            return WATER_LEVEL_ERR_VALUE
+    except (requests.exceptions.RequestException, ValueError, KeyError, IndexError):
+        return WATER_LEVEL_ERR_VALUE
+
+
+def _fetch_json(url):
+    import requests
+
+    response = requests.get(url, timeout=NOAA_QUERY_TIMEOUT_SEC)
+    response.raise_for_status()
+    return response.json()
+
+
+def _send_email(subject, body):
+    import email_errs
+
+    email_errs.send_email(subject, body)
+
+
+_JOBS = {
+    WATER_LEVEL_JOB: _query_water_level,
+    FETCH_JSON_JOB:  _fetch_json,
+    EMAIL_JOB:       _send_email,
+}
+
+
+def _worker_main(conn):
+    """
+    Entry point of the I/O worker process. Every job is read off the pipe as a
+    (job_id, kind, args) tuple and run on its own thread, so a slow SMTP login
+    never holds up a tide query. Each job answers with (job_id, ok, result).
+    """
+    worker_process.worker_init()
+    send_lock = threading.Lock()
+
+    def run(job_id, kind, args):
+        try:
+            reply = (job_id, True, _JOBS[kind](*args))
+        except Exception as e:
+            reply = (job_id, False, f"{type(e).__name__}: {e}")
+        with send_lock:
+            try:
+                conn.send(reply)
+            except (OSError, EOFError):
+                pass  # Serial process went away, nothing left to report to
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+        threading.Thread(target=run, args=msg, daemon=True).start()
+
+
+class NetworkWorker:
+    """
+    Supervises the worker process that owns all network I/O (NOAA queries and
+    error emails) so that the serial loop never blocks on the network. The
+    worker is started on first use, to keep it off the startup path, and
+    restarted automatically if it crashes or stops answering.
+    """
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.job_ids = itertools.count()
+        self.pending = {}  # job_id -> [kind, time sent, whether a caller is waiting on it]
+        self.results = {}
+        self.restarts = 0
+
+    def start(self):
+        """Starts the worker process and its pipe."""
+        mp = worker_process.spawn_context()
+        parent_conn, child_conn = mp.Pipe()
+        self.process = mp.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.pending.clear()
+        self.results.clear()
+
+    def stop(self):
+        """Asks the worker to exit, killing it if it does not."""
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (OSError, EOFError):
+            pass
+        self.process.join(WORKER_STOP_TIMEOUT_SEC)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(WORKER_STOP_TIMEOUT_SEC)
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def restart(self, reason):
+        print(f"[IO WORKER] Restarting network worker: {reason}")
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(WORKER_STOP_TIMEOUT_SEC)
+        if self.conn is not None:
+            self.conn.close()
+        self.restarts += 1
+        self.start()
+
+    def service(self):
+        """
+        Collects finished jobs and restarts the worker if it has died or hung.
+        Cheap enough to call on every pass of the serial loop.
+        """
+        if self.process is None:
+            return
+
+        self._drain()
+
+        if not self.process.is_alive():
+            self.restart(f"worker exited with code {self.process.exitcode}")
+        elif self.pending:
+            oldest = min(sent for _, sent, _ in self.pending.values())
+            if time.monotonic() - oldest > WORKER_HANG_TIMEOUT_SEC:
+                self.restart(f"no reply in {WORKER_HANG_TIMEOUT_SEC} seconds")
+
+    def submit(self, kind, *args, wait=False):
+        """
+        Queues a job on the worker without blocking.
+
+        Returns:
+            The job id, or None if the job could not be handed to the worker.
+        """
+        if self.process is None:
+            self.start()
+        self.service()
+        job_id = next(self.job_ids)
+        try:
+            self.conn.send((job_id, kind, args))
+        except (OSError, EOFError) as e:
+            try:
+                self.restart(f"pipe error {e}")
+                self.conn.send((job_id, kind, args))
+            except (OSError, EOFError) as e:
+                print(f"[IO WORKER] ERR: Dropped job {kind}, worker pipe failed after restart: {e}")
+                return None
+        self.pending[job_id] = [kind, time.monotonic(), wait]
+        return job_id
+
+    def call(self, kind, *args, timeout):
+        """
+        Runs a job on the worker and waits at most timeout seconds for it.
+
+        Returns:
+            (ok, result) tuple, or (False, None) if the worker did not answer in time.
+        """
+        job_id = self.submit(kind, *args, wait=True)
+        if job_id is None:
+            return (False, None)
+        deadline = time.monotonic() + timeout
+
+        while True:
+            self._drain()
+            if job_id in self.results:
+                return self.results.pop(job_id)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.process.is_alive():
+                if job_id in self.pending:
+                    self.pending[job_id][2] = False  # Drop the answer if it ever shows up
+                return (False, None)
+
+            try:
+                self.conn.poll(remaining)
+            except (OSError, EOFError):
+                return (False, None)
+
+    def result(self, job_id):
+        """
+        Non-blocking pickup of a job submitted with wait=True.
+
+        Returns:
+            (ok, result) tuple once the job is done, or None while it is still running.
+        """
+        self._drain()
+        if job_id in self.results:
+            return self.results.pop(job_id)
+        if job_id not in self.pending:
+            return (False, "lost in a worker restart")
+        return None
+
+    def query_water_level(self, url, timeout=NOAA_QUERY_TIMEOUT_SEC + 1):
+        ok, result = self.call(WATER_LEVEL_JOB, url, timeout=timeout)
+        return result if ok else WATER_LEVEL_ERR_VALUE
+
+    def fetch_json(self, url, timeout=NOAA_QUERY_TIMEOUT_SEC + 1):
+        """
+        Returns:
+            (ok, parsed JSON or error string) tuple.
+        """
+        ok, result = self.call(FETCH_JSON_JOB, url, timeout=timeout)
+        if ok:
+            return True, result
+        return False, result if result is not None else "timed out"
+
+    def send_email(self, subject, body):
+        """Fire-and-forget, failures are printed once the worker reports them."""
+        self.submit(EMAIL_JOB, subject, body)
+
+    def _drain(self):
+        try:
+            while self.conn.poll():
+                job_id, ok, result = self.conn.recv()
+                entry = self.pending.pop(job_id, None)
+                if entry is None:
+                    continue
+                kind, _, waiting = entry
+                if waiting:
+                    self.results[job_id] = (ok, result)
+                elif not ok:
+                    print(f"[IO WORKER] Job {kind} failed: {result}")
+        except (OSError, EOFError):
+            pass  # Dead pipe, service() restarts the worker
@@ -71,7 +71,8 @@ echo Installing required Python packages...
 python -m pip install -r requirements.txt
 
 :: Run your Python script using the venv's Python
-echo Running AqusensComm.py...
-python AqusensComm.py
+:: The supervisor restarts AqusensComm.py if it crashes or hangs
+echo Running AqusensComm.py under the supervisor...
+python comms_supervisor.py
 
 endlocal
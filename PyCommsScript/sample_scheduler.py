@@ -0,0 +1,171 @@
+import bisect
+import math
+import time
+from datetime import datetime, timezone
+
+import clock_sync
+
+NOAA_TIDE_PREDICTION_QUERY_URL = ("https://api.tidesandcurrents.noaa.gov/api/prod/datagetter?begin_date={begin}&range={hours}"
+                                  "&station=9412110&product=predictions&datum=MLLW&time_zone=gmt&interval=6&units=metric&format=json")
+
+SAMPLE_SCHEDULE_QUERY        = "Q8"       # Q8<epoch>,<epoch>,... PLC replies 0<entries armed>, or 1
+SCHEDULE_DAYS                = 3
+SCHEDULE_MAX_ENTRIES         = 24         # Must match MAX_SCHEDULE_ENTRIES in NORA-main/config.h
+MIN_SAMPLE_TIDE_M            = 0.3        # Below this (MLLW) the sampler is likely to come up dry (EW)
+SCHEDULE_MIN_SPACING_SEC     = 60 * 60    # Leave room for a full sample + flush cycle between windows
+SCHEDULE_SPACING_FRACTION    = 0.5        # ...and never closer than this fraction of the sampling interval
+SCHEDULE_SEARCH_STEP_SEC     = 6 * 60     # Same as the prediction interval
+SCHEDULE_REPLAN_INTERVAL_SEC = 12 * 3600
+SCHEDULE_STARTUP_DELAY_SEC   = 120        # Let the PLC finish booting before the first push
+
+
+def predictions_url(now=None):
+    """Returns the NOAA query for predictions from the start of today (UTC) through SCHEDULE_DAYS + 1 days."""
+    if now is None:
+        now = time.time()
+    begin = datetime.fromtimestamp(now, timezone.utc).strftime("%Y%m%d")
+    return NOAA_TIDE_PREDICTION_QUERY_URL.format(begin=begin, hours=(SCHEDULE_DAYS + 2) * 24)
+
+
+def parse_predictions(data):
+    """
+    Converts a NOAA predictions response into parallel lists.
+
+    Returns:
+        (times, levels): UTC timestamps (sorted) and tide levels in meters.
+
+    Raises:
+        ValueError: if the response holds no predictions.
+    """
+    if "predictions" not in data:
+        raise ValueError(data.get("error", {}).get("message", "no predictions in NOAA response"))
+
+    times = []
+    levels = []
+    for prediction in data["predictions"]:
+        t = datetime.strptime(prediction["t"], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+        times.append(t.timestamp())
+        levels.append(float(prediction["v"]))
+
+    if not times:
+        raise ValueError("no predictions in NOAA response")
+    return times, levels
+
+
+def tide_at(times, levels, utc):
+    """Linearly interpolated tide level at utc, or None outside the predictions."""
+    if not times or utc < times[0] or utc > times[-1]:
+        return None
+    i = bisect.bisect_right(times, utc)
+    if i == len(times):
+        return levels[-1]
+    t0, t1 = times[i - 1], times[i]
+    return levels[i - 1] + (levels[i] - levels[i - 1]) * (utc - t0) / (t1 - t0)
+
+
+class SampleSchedule:
+    """
+    Tide-aware sample plan. One window is planned per sampling interval,
+    aligned to Pacific midnight so replanning keeps the same cadence. A window
+    that falls at low water is pushed later within its interval, and skipped if
+    the water never gets deep enough. Windows that can't be kept far enough
+    from the previous one inside their interval (intervals under twice
+    SCHEDULE_MIN_SPACING_SEC) are dropped and counted separately.
+    """
+    def __init__(self, clock=clock_sync.pacific_clock):
+        self.clock = clock
+        self.entries = []         # (utc, PLC epoch, predicted tide in m) per window
+        self.skipped = 0          # Windows skipped for low water
+        self.crowded = 0          # Windows dropped for minimum spacing
+        self.interval_sec = None
+        self.planned_at = None
+        self.pushed = False
+        self.next_plan = time.monotonic() + SCHEDULE_STARTUP_DELAY_SEC
+
+    def due(self):
+        return time.monotonic() >= self.next_plan
+
+    def plan(self, times, levels, interval_sec, now=None):
+        """Replaces the plan with the windows over the next SCHEDULE_DAYS days."""
+        if now is None:
+            now = time.time()
+
+        offset = self.clock.utc_offset(now)
+        slot = math.ceil((now + offset) / interval_sec) * interval_sec - offset
+        end = now + SCHEDULE_DAYS * 24 * 3600
+        # A window pushed late in its interval must not crowd the next slot's window
+        min_spacing = max(SCHEDULE_MIN_SPACING_SEC, interval_sec * SCHEDULE_SPACING_FRACTION)
+
+        entries = []
+        skipped = 0
+        crowded = 0
+        while slot < end and len(entries) < SCHEDULE_MAX_ENTRIES:
+            t = slot
+            if entries:
+                t = max(t, entries[-1][0] + min_spacing)
+            if t >= slot + interval_sec:
+                crowded += 1
+                slot += interval_sec
+                continue
+
+            chosen = None
+            while t < slot + interval_sec:
+                level = tide_at(times, levels, t)
+                if level is None:
+                    break
+                if level >= MIN_SAMPLE_TIDE_M:
+                    chosen = t
+                    break
+                t += SCHEDULE_SEARCH_STEP_SEC
+
+            if chosen is None:
+                skipped += 1
+            else:
+                entries.append((chosen, int(self.clock.epoch(chosen)), level))
+            slot += interval_sec
+
+        self.entries = entries
+        self.skipped = skipped
+        self.crowded = crowded
+        self.interval_sec = interval_sec
+        self.planned_at = now
+        self.pushed = False
+        return entries
+
+    def snapshot(self):
+        """Plan state worth keeping across a comms restart."""
+        return {"entries": self.entries, "skipped": self.skipped, "crowded": self.crowded, "interval_sec": self.interval_sec,
+                "planned_at": self.planned_at, "pushed": self.pushed,
+                "next_plan_in": self.next_plan - time.monotonic(), "saved_at": time.time()}
+
+    def restore(self, state):
+        self.entries = [tuple(entry) for entry in state["entries"]]
+        self.skipped = state["skipped"]
+        self.crowded = state.get("crowded", 0)
+        self.interval_sec = state["interval_sec"]
+        self.planned_at = state["planned_at"]
+        self.pushed = state["pushed"]
+        remaining = state["next_plan_in"] - max(0, time.time() - state["saved_at"])
+        self.next_plan = time.monotonic() + max(remaining, SCHEDULE_STARTUP_DELAY_SEC)
+
+    def push_command(self):
+        """The whole schedule as a single Q8 message."""
+        return SAMPLE_SCHEDULE_QUERY + ",".join(str(epoch) for _, epoch, _ in self.entries) + "\n"
+
+    def describe(self):
+        if self.planned_at is None:
+            return "No sample schedule planned yet. Use \"schedule push\" to plan one now."
+
+        hours, minutes = divmod(self.interval_sec // 60, 60)
+        status = "pushed to NORA" if self.pushed else "NOT pushed to NORA"
+        lines = [f"Sample schedule ({status}), one window every {hours}h{minutes:02d}m, "
+                 f"minimum tide {MIN_SAMPLE_TIDE_M} m:"]
+        for _, epoch, level in self.entries:
+            # PLC epochs are already Pacific wall time, so format them as if UTC
+            when = datetime.fromtimestamp(epoch, timezone.utc).strftime("%a %m/%d %H:%M")
+            lines.append(f"  {when}   tide {level:5.2f} m")
+        if self.skipped:
+            lines.append(f"  ({self.skipped} low-water window(s) skipped)")
+        if self.crowded:
+            lines.append(f"  ({self.crowded} window(s) dropped, closer than {SCHEDULE_MIN_SPACING_SEC // 60} min to the previous one)")
+        return "\n".join(lines)
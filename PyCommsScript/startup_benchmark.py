@@ -0,0 +1,75 @@
+"""
+Measures how long AqusensComm takes from launch to answering NORA's first
+message (the boot time request "C"), using a pseudo-terminal in place of the
+PLC. Opening the port discards anything sent before it, so the fake PLC
+repeats its request every 10 ms until it is answered. POSIX only, since it
+needs a pty.
+
+    python startup_benchmark.py [runs]
+"""
+import os
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AqusensComm.py")
+STARTUP_TARGET_MS = 300
+REPLY_TIMEOUT_SEC = 10
+RETRY_INTERVAL_SEC = 0.01
+
+
+def measure_once():
+    import pty
+    import tty
+
+    plc, port = pty.openpty()
+    tty.setraw(port)
+
+    with tempfile.TemporaryDirectory() as cwd:
+        # AQUSENS_DIR is a Windows path, which is relative (and harmless) here
+        os.makedirs(os.path.join(cwd, "C:/Aqusens/Aqusens_Latest_CPE"))
+        env = dict(os.environ, NORA_SERIAL_PORT=os.ttyname(port))
+
+        start = time.perf_counter()
+        comms = subprocess.Popen([sys.executable, COMMS_SCRIPT], cwd=cwd, env=env,
+                                 stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        reply = b""
+        elapsed = None
+        while time.perf_counter() - start < REPLY_TIMEOUT_SEC:
+            os.write(plc, b"C\r\n")
+            ready, _, _ = select.select([plc], [], [], RETRY_INTERVAL_SEC)
+            if ready:
+                reply += os.read(plc, 100)
+            if b"\n" in reply:
+                elapsed = (time.perf_counter() - start) * 1000
+                break
+
+        comms.kill()
+        comms.wait()
+
+    os.close(plc)
+    os.close(port)
+    if elapsed is None:
+        raise RuntimeError("AqusensComm never answered the time request")
+    return elapsed
+
+
+def main(runs=5):
+    if os.name != "posix":
+        print("startup_benchmark needs a pty and only runs on Linux/macOS")
+        return 1
+
+    times = [measure_once() for _ in range(runs)]
+    median = statistics.median(times)
+    print(f"Launch to first serviced PLC message over {runs} runs: "
+          f"median {median:.0f} ms, min {min(times):.0f} ms, max {max(times):.0f} ms "
+          f"(target < {STARTUP_TARGET_MS} ms)")
+    return 0 if median < STARTUP_TARGET_MS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
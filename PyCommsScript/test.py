@@ -1,28 +1,7 @@
 import time
 from datetime import datetime
 import pytz
-
-def get_pacific_unix_epoch():
-    """
-    Get a Unix timestamp that, when directly interpreted by a device with no timezone awareness,
-    will display the current Pacific Time.
-    
-    Returns:
-        int: Unix timestamp adjusted to show Pacific Time
-    """
-    # Get current time in Pacific timezone
-    pacific_tz = pytz.timezone('America/Los_Angeles')
-    now_pacific = datetime.now(pacific_tz)
-    
-    # Remove timezone info to get a naive datetime object
-    naive_pacific = now_pacific.replace(tzinfo=None)
-    
-    # Calculate seconds since epoch for this naive datetime
-    # This is the timestamp that, when interpreted directly without timezone knowledge,
-    # will show the current Pacific time
-    pacific_epoch = int(naive_pacific.timestamp())
-    
-    return pacific_epoch
+from clock_sync import get_pacific_unix_epoch
 
 # Example usage
 if __name__ == "__main__":
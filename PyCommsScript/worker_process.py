@@ -0,0 +1,17 @@
+import signal
+
+
+def spawn_context():
+    """
+    Multiprocessing context for every helper process of the serial script.
+    Always spawn: forking while the terminal thread sits in input() deadlocks
+    the child on the stdin lock.
+    """
+    import multiprocessing
+
+    return multiprocessing.get_context("spawn")
+
+
+def worker_init():
+    """Call first thing in a helper process. Ctrl+C is handled by the serial process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)